@@ -1,21 +1,46 @@
-from typing import List, Tuple
+from typing import Iterator, List, Optional, Set, TextIO, Tuple
 from pathlib import Path
 from argparse import ArgumentParser, Namespace
+from collections import Counter
+from fnmatch import fnmatch
 import logging
+import os
 import sys
 
-import astroid
 from xml.etree import ElementTree as ET
 
 from .data_types import ModuleData
 from .text_layouts import ModuleLayout as ModuleLayoutText
 from .html_layouts import ModuleLayout as ModuleLayoutHtml
 from .default_styling import get_default_styling
+from .scheduler import load_modules
 
 
 def parse_args() -> Namespace:
     parser = ArgumentParser()
-    parser.add_argument("dir", type=str, help="root directory path of project.")
+    parser.add_argument(
+        "dir",
+        type=str,
+        nargs="*",
+        help="root directory path of project. Several roots can be given at once.",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        help="""File listing additional root directories, one per line.
+        Relative paths are resolved against the directory of the manifest.""",
+    )
+    parser.add_argument(
+        "--output-dir",
+        type=str,
+        help="""Write one <root name>.html file per root to OUTPUT_DIR instead of stdout.
+        Required when outlining more than one root.""",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="number of worker processes used for parsing. Defaults to the number of CPUs.",
+    )
     parser.add_argument(
         "--include-test",
         action="store_true",
@@ -45,21 +70,19 @@ def parse_args() -> Namespace:
     return parser.parse_args()
 
 
-def build_output_string(path_and_modules: List, absolute_path: bool, root: Path) -> str:
+def build_output_string(
+    path_and_modules: List[Tuple[Path, ModuleData]], absolute_path: bool, root: Path
+) -> str:
     s = ""
     for path, module in path_and_modules:
         # TODO: let ModuleLayout handle path string as well
         s += str(path) if absolute_path else str(path.relative_to(root))
-        s += "\n" + str(ModuleLayoutText(ModuleData(module), n_indent=0))
+        s += "\n" + str(ModuleLayoutText(module, n_indent=0))
     return s
 
 
-def build_html_tree(
-    path_and_modules: List[Tuple[Path, astroid.Module]],
-    absolute_path: bool,
-    root: Path,
-    styling: str,
-) -> ET.Element:
+def build_html_skeleton(styling: str) -> ET.Element:
+    """Html document with styling and an empty body, for the modules to go in."""
     html = ET.Element("html")
     head = ET.Element("head")
     html.append(head)
@@ -74,14 +97,137 @@ def build_html_tree(
     body = ET.Element("body")
     html.append(body)
 
-    for path, module in path_and_modules:
-        mod = ModuleLayoutHtml(
-            filepath=path if absolute_path else path.relative_to(root),
-            module=ModuleData(module),
+    return html
+
+
+def read_roots(dirs: List[str], manifest: Optional[str]) -> List[Path]:
+    roots = [Path.cwd() / Path(d) for d in dirs]
+    if manifest:
+        manifest_path = Path.cwd() / Path(manifest)
+        with open(manifest_path) as fh:
+            lines = [line.strip() for line in fh]
+        # skip empty lines and comments
+        roots += [
+            manifest_path.parent / Path(line)
+            for line in lines
+            if line and not line.startswith("#")
+        ]
+    for root in roots:
+        if not root.is_dir():
+            raise Exception(f"'dir' must be an existing directory: '{root}'.")
+    return roots
+
+
+def find_filepaths(
+    root: Path, include_test: bool, xincl: Optional[str]
+) -> Iterator[Path]:
+    """Yield the .py filepaths in root as the directory traversal finds them."""
+    # filepaths found via the xincl glob pattern, all others are ignored.
+    xincl_paths = set(root.rglob(xincl)) if xincl else None
+
+    n_found = 0
+    n_ignored = 0
+    for filepath in root.rglob("*.py"):
+        n_found += 1
+        # same files as matched by '**/test_*.py'
+        if not include_test and fnmatch(filepath.name, "test_*.py"):
+            n_ignored += 1
+            continue
+        if xincl_paths is not None and filepath not in xincl_paths:
+            n_ignored += 1
+            continue
+        yield filepath
+
+    if xincl and n_ignored == n_found:
+        logging.warning(
+            f"All filepaths are being ignored with the current XINCL glob pattern: {xincl}"
         )
-        body.append(mod)
 
-    return html
+
+def output_filenames(roots: List[Path]) -> List[str]:
+    """One .html filename per root, named after the root directory.
+    Roots sharing a name are named after their parent directory as well,
+    e.g. 'a-foo.html' and 'b-foo.html' for roots 'a/foo' and 'b/foo',
+    so a root's filename doesn't depend on the other roots in the batch.
+    A numbered suffix is only added if that name is still taken.
+    """
+    names = [root.resolve().name or "root" for root in roots]
+    name_counts = Counter(names)
+
+    # reserve the plain name of every root with a unique name first
+    used: Set[str] = {name for name in names if name_counts[name] == 1}
+    filenames: List[str] = []
+    for root, name in zip(roots, names):
+        if name_counts[name] > 1:
+            parent = root.resolve().parent.name
+            name = f"{parent}-{name}" if parent else name
+            unique_name = name
+            n = 1
+            while unique_name in used:
+                n += 1
+                unique_name = f"{name}-{n}"
+            name = unique_name
+            used.add(name)
+        filenames.append(f"{name}.html")
+    return filenames
+
+
+def split_html_document(styling: str) -> Tuple[str, str]:
+    """Serialized html document around the (empty) body content,
+    so modules can be written in between as they are rendered.
+    """
+    html = build_html_skeleton(styling)
+    document = ET.tostring(html, encoding="unicode", method="html")
+    # split on the last '</body>',
+    # the styling is written unescaped and may contain one too.
+    before, after = document.rsplit("</body>", 1)
+    return before, "</body>" + after
+
+
+class HtmlOutput:
+    """Html document of one root, written module by module.
+
+    Without a path, the document is written to stdout.
+    With a path, it is written to a temporary file next to path, which is kept open
+    from the first module on and renamed to path once the root is finished.
+    That way a crashed run does not leave truncated outlines behind.
+    """
+
+    def __init__(self, before: str, after: str, path: Optional[Path] = None) -> None:
+        self.before = before
+        self.after = after
+        self.path = path
+        self.tmp_path = None if path is None else path.with_name(path.name + ".tmp")
+        self.fh: Optional[TextIO] = None
+
+    def _write(self, s: str) -> None:
+        if self.fh is None:
+            # truncates leftovers from an earlier run
+            self.fh = sys.stdout if self.tmp_path is None else open(self.tmp_path, "w")
+            s = self.before + s
+
+        self.fh.write(s)
+        if self.tmp_path is None:
+            self.fh.flush()
+
+    def write(self, module_html: str) -> None:
+        self._write(module_html)
+
+    def finish(self) -> None:
+        self._write(self.after)
+        if self.tmp_path is not None:
+            self.fh.close()
+            os.replace(self.tmp_path, self.path)
+
+
+def render_module(
+    filepath: Path, module: ModuleData, absolute_path: bool, root: Path
+) -> str:
+    mod = ModuleLayoutHtml(
+        filepath=filepath if absolute_path else filepath.relative_to(root),
+        module=module,
+    )
+    return ET.tostring(mod, encoding="unicode", method="html")
 
 
 def main():
@@ -103,51 +249,57 @@ def main():
         with open(css_path) as fh:
             css_styling = fh.read()
 
-    root = Path.cwd() / Path(args.dir)
-    if not root.is_dir():
-        raise Exception("'dir' must be an existing directory.")
-
-    # find all .py filepaths in root
-    filepaths: List[Path] = list(root.rglob("*.py"))
-
-    # TODO: don't traverse directory more than once?
-    # filepaths to ignore
-    paths_to_ignore = []
-    if not args.include_test:
-        paths_to_ignore += list(root.rglob("**/test_*.py"))
-    if args.xincl:
-        # ignore all other filepaths than those found via xincl glob pattern.
-        paths_to_ignore += [
-            f for f in filepaths if f not in list(root.rglob(args.xincl))
+    if args.jobs is not None and args.jobs < 1:
+        raise ValueError("--jobs must be at least 1.")
+
+    roots: List[Path] = read_roots(args.dir, args.manifest)
+    if not roots:
+        raise Exception("At least one 'dir' (or a --manifest) must be given.")
+    if len(roots) > 1 and not args.output_dir:
+        raise Exception("--output-dir is required when outlining more than one root.")
+
+    # discovery is lazy, files are read and parsed while traversal continues
+    root_filepaths: List[Iterator[Path]] = [
+        find_filepaths(root, include_test=args.include_test, xincl=args.xincl)
+        for root in roots
+    ]
+
+    html_before, html_after = split_html_document(css_styling)
+    if args.output_dir:
+        output_dir = Path(args.output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        outputs: List[HtmlOutput] = [
+            HtmlOutput(html_before, html_after, path=output_dir / filename)
+            for filename in output_filenames(roots)
         ]
-        if len(paths_to_ignore) == len(filepaths):
-            logging.warning(
-                f"All filepaths are being ignored with the current XINCL glob pattern: {args.xincl}"
-            )
+    else:
+        outputs = [HtmlOutput(html_before, html_after)]
 
-    # combine each python file with its module Abstract Syntax Tree
-    path_and_modules: List[Tuple[Path, astroid.Module]] = []
-    for filepath in [f for f in filepaths if f not in paths_to_ignore]:
-        try:
-            with open(filepath) as fh:
-                module = astroid.parse(fh.read())
-            path_and_modules.append((filepath, module))
-        except Exception as e:
-            logging.warning(
-                f"Ignoring file '{filepath}' because of the following error:"
+    # render and write each module as soon as it is parsed,
+    # so the first modules show up before the whole outline is done.
+    # all roots are parsed through one shared worker pool and cache.
+    modules = load_modules(root_filepaths, jobs=args.jobs)
+    try:
+        for i, filepath, module in modules:
+            if filepath is None:
+                # all modules of root i are written
+                outputs[i].finish()
+                continue
+            outputs[i].write(
+                render_module(
+                    filepath, module, absolute_path=args.absolute_path, root=roots[i]
+                )
             )
-            logging.warning(e)
-
-    # build html tree
-    html: ET.Element = build_html_tree(
-        path_and_modules=path_and_modules,
-        absolute_path=args.absolute_path,
-        root=root,
-        styling=css_styling,
-    )
-
-    # write HTML to stdout
-    ET.ElementTree(html).write(sys.stdout, encoding="unicode", method="html")
+    except BrokenPipeError:
+        # stdout was closed early, e.g. by quitting a pager.
+        # point stdout to devnull, so flushing it on exit doesn't raise again.
+        # see https://docs.python.org/3/library/signal.html#note-on-sigpipe
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        sys.exit(1)
+    finally:
+        # stop the pipeline, shutting down its worker pools
+        modules.close()
 
 
 if __name__ == "__main__":
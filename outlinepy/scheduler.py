@@ -0,0 +1,168 @@
+from typing import Deque, Dict, Iterable, List, Iterator, Optional, Tuple
+from pathlib import Path
+from collections import OrderedDict, deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+import hashlib
+import logging
+import os
+
+import astroid
+
+from .data_types import ModuleData
+
+
+def read_source(filepath: Path) -> str:
+    with open(filepath) as fh:
+        return fh.read()
+
+
+def parse_source(source: str) -> ModuleData:
+    """Parse python source code into ModuleData.
+    Runs inside a worker process, so only the (picklable) ModuleData is sent back.
+    """
+    try:
+        return ModuleData(astroid.parse(source))
+    except Exception as e:
+        # astroid exceptions can't be unpickled in the parent process,
+        # which would break the whole pool; pass on the message only.
+        raise ValueError(str(e)) from None
+
+
+class ModuleCache:
+    """Parse jobs keyed by a hash of the source code.
+    Identical files (e.g. vendored copies shared between roots) are only parsed once.
+
+    Holds at most max_size jobs, dropping the least recently used one,
+    so memory doesn't grow with the total number of files in a batch.
+    """
+
+    def __init__(self, executor: Executor, max_size: int = 4096) -> None:
+        self.executor = executor
+        self.max_size = max_size
+        self._futures: "OrderedDict[str, Future]" = OrderedDict()
+
+    def submit(self, source: str) -> Future:
+        key = hashlib.sha1(source.encode()).hexdigest()
+        if key in self._futures:
+            self._futures.move_to_end(key)
+            return self._futures[key]
+
+        future = self.executor.submit(parse_source, source)
+        self._futures[key] = future
+        if len(self._futures) > self.max_size:
+            self._futures.popitem(last=False)
+        return future
+
+
+class _Job:
+    """A file on its way through the pipeline.
+    future is first the read of the file, then the parse of its source.
+    """
+
+    def __init__(self, filepath: Path, future: Future) -> None:
+        self.filepath = filepath
+        self.future = future
+        self.reading = True
+
+    def ready(self) -> bool:
+        return not self.reading and self.future.done()
+
+
+def _ignore_file(filepath: Path, e: Exception) -> None:
+    logging.warning(f"Ignoring file '{filepath}' because of the following error:")
+    logging.warning(e)
+
+
+def load_modules(
+    root_filepaths: List[Iterable[Path]], jobs: Optional[int] = None
+) -> Iterator[Tuple[int, Optional[Path], Optional[ModuleData]]]:
+    """Pipeline of discovery -> read -> parse over every root,
+    sharing one thread pool for reading and one process pool and cache for parsing.
+
+    Files are taken round-robin across roots and yielded as
+    (root index, filepath, module) as soon as each module is ready.
+    The order is only kept per root: filepaths of a root keep their discovery order,
+    but a root waiting on a slow file doesn't hold back the other roots.
+    After the last module of a root, (root index, None, None) marks that the root is done.
+    Files that cannot be read or parsed are logged and left out.
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    # how many files may be read or parsed at once,
+    # and how far each root may run ahead of its first unfinished file.
+    buffer_size = 4 * jobs
+
+    n_roots = len(root_filepaths)
+    filepaths = [iter(f) for f in root_filepaths]
+    queues: List[Deque[_Job]] = [deque() for _ in range(n_roots)]
+    discovered = [False] * n_roots
+    finished = [False] * n_roots
+    # running futures and the jobs waiting on them,
+    # files with identical source share one parse future.
+    running: Dict[Future, List[_Job]] = {}
+    next_root = 0
+
+    def advance(job: _Job) -> None:
+        """Move job on to parsing once it is read, or wait for its running future."""
+        while job.future.done():
+            if not job.reading:
+                return
+            job.reading = False
+            # a failed read is reported like a failed parse
+            if job.future.exception() is not None:
+                return
+            job.future = cache.submit(job.future.result())
+        running.setdefault(job.future, []).append(job)
+
+    with ThreadPoolExecutor(max_workers=jobs) as readers, ProcessPoolExecutor(
+        max_workers=jobs
+    ) as parsers:
+        cache = ModuleCache(parsers)
+
+        while not all(finished):
+            # submit files round-robin, skipping roots that are done or have a full buffer.
+            n_skipped = 0
+            while len(running) < buffer_size and n_skipped < n_roots:
+                i = next_root
+                next_root = (next_root + 1) % n_roots
+                if discovered[i] or len(queues[i]) >= buffer_size:
+                    n_skipped += 1
+                    continue
+                filepath = next(filepaths[i], None)
+                if filepath is None:
+                    discovered[i] = True
+                    n_skipped += 1
+                    continue
+                n_skipped = 0
+                job = _Job(filepath, readers.submit(read_source, filepath))
+                queues[i].append(job)
+                advance(job)
+
+            if running:
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    for job in running.pop(future):
+                        advance(job)
+
+            # pass on finished modules of each root in order
+            for i, queue in enumerate(queues):
+                if finished[i]:
+                    continue
+                while queue and queue[0].ready():
+                    job = queue.popleft()
+                    try:
+                        module = job.future.result()
+                    except Exception as e:
+                        _ignore_file(job.filepath, e)
+                        continue
+                    yield i, job.filepath, module
+                if discovered[i] and not queue:
+                    finished[i] = True
+                    yield i, None, None